@@ -3,8 +3,9 @@ Google Search Agent for web verification
 Uses Google Custom Search API to find reliable sources
 """
 import httpx
-from typing import List, Dict, Any
-from config import GOOGLE_API_KEY, GOOGLE_CSE_ID
+from typing import List, Dict, Any, Tuple
+from config import GOOGLE_API_KEY, GOOGLE_CSE_ID, SEARCH_BUDGET_TIGHT_THRESHOLD
+from utils.budget import budget_manager, GOOGLE_CSE, is_daily_quota_error, retry_after_seconds
 
 
 class SearchAgent:
@@ -28,6 +29,40 @@ class SearchAgent:
             "un.org"
         ]
     
+    def search_mode(self) -> str:
+        """
+        Pick a search backend based on the remaining Google CSE budget
+        
+        Returns:
+            "full" to issue both queries via Google CSE,
+            "tight" to issue only the fact-check query via Google CSE,
+            "fallback" to issue only the fact-check query via DuckDuckGo,
+            "duckduckgo" to issue both queries via DuckDuckGo when CSE is not configured
+        """
+        if not self.cse_id:
+            return "duckduckgo"
+        if budget_manager.remaining(GOOGLE_CSE) <= 0:
+            return "fallback"
+        if budget_manager.remaining_fraction(GOOGLE_CSE) < SEARCH_BUDGET_TIGHT_THRESHOLD:
+            return "tight"
+        return "full"
+    
+    def plan_queries(self, claim: str, search_query: str) -> List[Tuple[str, int]]:
+        """
+        Plan the searches to run for a claim within the remaining budget
+        
+        Args:
+            claim: The original claim
+            search_query: The fact-check oriented search query
+            
+        Returns:
+            List of (query, num_results) pairs
+        """
+        if self.search_mode() in ("full", "duckduckgo"):
+            # Also search with just the claim for broader results
+            return [(search_query, 10), (claim, 5)]
+        return [(search_query, 10)]
+    
     async def search(self, query: str, num_results: int = 10) -> List[Dict[str, Any]]:
         """
         Perform a Google Custom Search
@@ -43,6 +78,10 @@ class SearchAgent:
             # Fallback to web search simulation if no CSE ID
             return await self._fallback_search(query, num_results)
         
+        if not await budget_manager.acquire(GOOGLE_CSE):
+            # Out of Google CSE budget, use the fallback backend instead
+            return await self._fallback_search(query, num_results)
+        
         params = {
             "key": self.api_key,
             "cx": self.cse_id,
@@ -67,6 +106,13 @@ class SearchAgent:
                 
                 return results
             except Exception as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                    if is_daily_quota_error(e.response.text):
+                        # Google reports the daily quota as spent, stop spending until reset
+                        budget_manager.mark_exhausted(GOOGLE_CSE)
+                    else:
+                        # Per-minute limit, back off without touching the daily counter
+                        budget_manager.cool_down(GOOGLE_CSE, retry_after_seconds(e.response.headers))
                 print(f"Search error: {e}")
                 return await self._fallback_search(query, num_results)
     
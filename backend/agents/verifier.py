@@ -10,6 +10,7 @@ from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, LLM_MODEL
 from utils.prompts import SYSTEM_PROMPT, VERIFICATION_PROMPT
+from utils.budget import budget_manager, OPENROUTER, is_daily_quota_error, retry_after_seconds
 from agents.search_agent import search_agent
 from models.schemas import VerificationResponse, TrustedSource
 
@@ -82,17 +83,16 @@ class NewsVerifier:
     async def _web_search(self, state: VerificationState) -> VerificationState:
         """Perform web search for verification"""
         try:
-            # Perform search
-            results = await search_agent.search(state["search_query"], num_results=10)
-            
-            # Also search with just the claim for broader results
-            additional_results = await search_agent.search(state["claim"], num_results=5)
+            # Perform only the searches the remaining budget allows
+            results = []
+            for query, num_results in search_agent.plan_queries(state["claim"], state["search_query"]):
+                results += await search_agent.search(query, num_results=num_results)
             
             # Combine and deduplicate
             all_urls = set()
             combined_results = []
             
-            for result in results + additional_results:
+            for result in results:
                 if result["url"] not in all_urls:
                     all_urls.add(result["url"])
                     combined_results.append(result)
@@ -132,6 +132,11 @@ class NewsVerifier:
             search_results=state["search_results"]
         )
         
+        if not await budget_manager.acquire(OPENROUTER, max_wait=10.0):
+            if budget_manager.remaining(OPENROUTER) <= 0:
+                return {**state, "error": "LLM request budget exhausted, please try again later"}
+            return {**state, "error": "LLM is rate limited, please try again in a minute"}
+        
         try:
             # Call LLM
             messages = [
@@ -144,6 +149,14 @@ class NewsVerifier:
             
             return {**state, "llm_response": llm_response}
         except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                if is_daily_quota_error(str(e)):
+                    # OpenRouter reports the daily quota as spent, stop spending until reset
+                    budget_manager.mark_exhausted(OPENROUTER)
+                else:
+                    # Per-minute limit, back off without touching the daily counter
+                    response = getattr(e, "response", None)
+                    budget_manager.cool_down(OPENROUTER, retry_after_seconds(getattr(response, "headers", None)))
             return {**state, "error": f"LLM analysis failed: {str(e)}"}
     
     async def _format_response(self, state: VerificationState) -> VerificationState:
@@ -18,3 +18,24 @@ LLM_MODEL = "arcee-ai/trinity-large-preview:free"
 # App Configuration
 APP_NAME = "Fake News Verification API"
 DEBUG = os.getenv("DEBUG", "true").lower() == "true"
+
+# Upstream Budget Configuration
+# Daily quotas reset at midnight in each upstream's *_RESET_TIMEZONE
+# (Google CSE resets at midnight Pacific, OpenRouter at midnight UTC)
+GOOGLE_CSE_DAILY_QUOTA = int(os.getenv("GOOGLE_CSE_DAILY_QUOTA", "100"))
+GOOGLE_CSE_PER_SECOND = float(os.getenv("GOOGLE_CSE_PER_SECOND", "1.0"))
+GOOGLE_CSE_RESET_TIMEZONE = os.getenv("GOOGLE_CSE_RESET_TIMEZONE", "America/Los_Angeles")
+OPENROUTER_DAILY_QUOTA = int(os.getenv("OPENROUTER_DAILY_QUOTA", "50"))
+OPENROUTER_PER_SECOND = float(os.getenv("OPENROUTER_PER_SECOND", "0.33"))
+OPENROUTER_RESET_TIMEZONE = os.getenv("OPENROUTER_RESET_TIMEZONE", "UTC")
+# Below this fraction of the daily CSE quota, only the fact-check query is issued per claim
+SEARCH_BUDGET_TIGHT_THRESHOLD = float(os.getenv("SEARCH_BUDGET_TIGHT_THRESHOLD", "0.5"))
+BUDGET_STATE_FILE = os.getenv(
+    "BUDGET_STATE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "budget_state.json")
+)
+# Seconds between merges of in-memory spend into BUDGET_STATE_FILE; workers sharing
+# the file can overspend a daily quota by at most what they spend in one interval
+BUDGET_FLUSH_INTERVAL = float(os.getenv("BUDGET_FLUSH_INTERVAL", "5"))
+# Token required in the X-Admin-Token header for admin endpoints (disabled when empty)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
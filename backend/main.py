@@ -2,19 +2,32 @@
 Fake News Verification API
 FastAPI backend for verifying news claims using AI
 """
-from fastapi import FastAPI, HTTPException
+import asyncio
+import secrets
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
-from models.schemas import VerificationRequest, VerificationResponse, ErrorResponse
+from contextlib import asynccontextmanager, suppress
+from models.schemas import VerificationRequest, VerificationResponse, ErrorResponse, BudgetStatusResponse
 from agents.verifier import news_verifier
-from config import APP_NAME, DEBUG
+from agents.search_agent import search_agent
+from utils.budget import budget_manager
+from config import APP_NAME, DEBUG, ADMIN_TOKEN, BUDGET_FLUSH_INTERVAL
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events"""
     print(f"🚀 {APP_NAME} is starting...")
+    flush_task = asyncio.create_task(budget_manager.run_flush_loop(BUDGET_FLUSH_INTERVAL))
     yield
+    flush_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await flush_task
+    try:
+        await budget_manager.flush()
+    except Exception as e:
+        print(f"Budget flush error: {e}")
     print(f"👋 {APP_NAME} is shutting down...")
 
 
@@ -74,6 +87,26 @@ async def verify_news(request: VerificationRequest):
         )
 
 
+@app.get("/api/admin/budget", response_model=BudgetStatusResponse)
+async def budget_status(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Upstream budget status
+    
+    Returns the remaining per-day and per-second budget for Google CSE and
+    OpenRouter, and the search mode the budget currently allows.
+    """
+    if not ADMIN_TOKEN:
+        # Admin endpoints are disabled unless a token is configured
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    return BudgetStatusResponse(
+        search_mode=search_agent.search_mode(),
+        upstreams=budget_manager.snapshot()
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=DEBUG)
@@ -1,2 +1,2 @@
 # Models package
-from .schemas import VerificationRequest, VerificationResponse, TrustedSource, ErrorResponse
+from .schemas import VerificationRequest, VerificationResponse, TrustedSource, ErrorResponse, UpstreamBudget, BudgetStatusResponse
@@ -2,7 +2,7 @@
 Pydantic schemas for API request/response models
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import date
 
 
@@ -29,6 +29,22 @@ class VerificationResponse(BaseModel):
     last_verified_date: str = Field(..., description="Date in YYYY-MM-DD format")
 
 
+class UpstreamBudget(BaseModel):
+    """Schema for the budget state of one upstream"""
+    day: str = Field(..., description="Current quota day in YYYY-MM-DD format")
+    daily_quota: int = Field(..., description="Requests allowed per day")
+    daily_used: int = Field(..., description="Requests spent today")
+    daily_remaining: int = Field(..., description="Requests left today")
+    per_second_rate: float = Field(..., description="Requests allowed per second")
+    per_second_available: float = Field(..., description="Requests available right now")
+
+
+class BudgetStatusResponse(BaseModel):
+    """Schema for upstream budget status"""
+    search_mode: str = Field(..., description="full | tight | fallback | duckduckgo")
+    upstreams: Dict[str, UpstreamBudget] = Field(default_factory=dict, description="Budget state per upstream")
+
+
 class ErrorResponse(BaseModel):
     """Schema for error response"""
     error: str
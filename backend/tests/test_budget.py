@@ -0,0 +1,158 @@
+"""
+Tests for the upstream budget manager
+"""
+import asyncio
+import json
+import pytest
+from utils.budget import BudgetManager, is_daily_quota_error, retry_after_seconds
+
+LIMITS = {"search": {"daily": 10, "per_second": 100}}
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return str(tmp_path / "budget_state.json")
+
+
+def read_state(state_file):
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def spend(manager, count, upstream="search"):
+    for _ in range(count):
+        assert manager.try_acquire(upstream)
+
+
+def test_spend_is_persisted_on_flush(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    spend(manager, 3)
+    asyncio.run(manager.flush())
+
+    assert read_state(state_file)["search"]["used"] == 3
+    assert BudgetManager(LIMITS, state_file).remaining("search") == 7
+
+
+def test_managers_sharing_a_file_merge_spend(state_file):
+    first = BudgetManager(LIMITS, state_file)
+    second = BudgetManager(LIMITS, state_file)
+    spend(first, 3)
+    spend(second, 4)
+
+    asyncio.run(first.flush())
+    asyncio.run(second.flush())
+    assert read_state(state_file)["search"]["used"] == 7
+
+    # The first manager picks up the second one's spend on its next flush
+    asyncio.run(first.flush())
+    assert first.remaining("search") == 3
+    assert second.remaining("search") == 3
+
+
+def test_daily_quota_is_enforced(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    spend(manager, 10)
+    assert not manager.try_acquire("search")
+    assert not asyncio.run(manager.acquire("search", max_wait=0.1))
+
+
+def test_stored_count_from_a_previous_day_is_ignored(state_file):
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump({"search": {"day": "2000-01-01", "used": 10}}, f)
+
+    manager = BudgetManager(LIMITS, state_file)
+    assert manager.remaining("search") == 10
+
+    spend(manager, 2)
+    asyncio.run(manager.flush())
+    state = read_state(state_file)["search"]
+    assert state["used"] == 2
+    assert state["day"] != "2000-01-01"
+
+
+def test_counter_rolls_over_to_a_new_day(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    spend(manager, 10)
+    # Pretend the spend happened on a previous quota day
+    manager.daily["search"].day = "2000-01-01"
+
+    assert manager.remaining("search") == 10
+    asyncio.run(manager.flush())
+    assert read_state(state_file)["search"]["used"] == 0
+
+
+def test_malformed_entries_count_as_zero(state_file):
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump({"search": "bad", "other": {"day": "2000-01-01", "used": "x"}}, f)
+
+    manager = BudgetManager(LIMITS, state_file)
+    assert manager.remaining("search") == 10
+    spend(manager, 1)
+    asyncio.run(manager.flush())
+    assert read_state(state_file)["search"]["used"] == 1
+
+
+def test_mark_exhausted_spends_the_daily_quota(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    spend(manager, 2)
+    manager.mark_exhausted("search")
+
+    assert manager.remaining("search") == 0
+    assert not manager.try_acquire("search")
+    asyncio.run(manager.flush())
+    assert read_state(state_file)["search"]["used"] == 10
+
+
+def test_cool_down_leaves_the_daily_quota_alone(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    spend(manager, 2)
+    manager.cool_down("search", 60)
+
+    assert not manager.try_acquire("search")
+    assert not asyncio.run(manager.acquire("search", max_wait=0.1))
+    assert manager.remaining("search") == 8
+
+
+def test_short_cool_down_is_waited_out(state_file):
+    manager = BudgetManager(LIMITS, state_file)
+    manager.cool_down("search", 0.1)
+
+    assert asyncio.run(manager.acquire("search", max_wait=1.0))
+    assert manager.remaining("search") == 9
+
+
+def test_unknown_timezone_falls_back_to_utc(state_file):
+    limits = {"search": {"daily": 10, "per_second": 100, "timezone": "Not/AZone"}}
+    manager = BudgetManager(limits, state_file)
+    assert manager.remaining("search") == 10
+
+
+@pytest.mark.parametrize("body", [
+    # Google CSE daily quota
+    '{"error": {"code": 429, "message": "Quota exceeded for quota metric \'Queries\' and limit '
+    '\'Queries per day\' of service \'customsearch.googleapis.com\'", "errors": [{"reason": '
+    '"rateLimitExceeded"}], "status": "RESOURCE_EXHAUSTED"}}',
+    '{"error": {"code": 429, "errors": [{"domain": "usageLimits", "reason": "dailyLimitExceeded"}]}}',
+    # OpenRouter free-tier daily limit, as raised by the OpenAI client
+    "Error code: 429 - {'error': {'message': 'Rate limit exceeded: free-models-per-day. ', 'code': 429}}",
+])
+def test_daily_quota_errors_are_detected(body):
+    assert is_daily_quota_error(body)
+
+
+@pytest.mark.parametrize("body", [
+    # Google CSE per-minute limit
+    '{"error": {"code": 429, "message": "Quota exceeded for quota metric \'Queries\' and limit '
+    '\'Queries per minute\' of service \'customsearch.googleapis.com\'", "errors": [{"reason": '
+    '"rateLimitExceeded"}], "status": "RESOURCE_EXHAUSTED"}}',
+    # OpenRouter free-tier per-minute limit
+    "Error code: 429 - {'error': {'message': 'Rate limit exceeded: free-models-per-min. ', 'code': 429}}",
+])
+def test_rate_limit_errors_are_not_daily_quota_errors(body):
+    assert not is_daily_quota_error(body)
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({"Retry-After": "3"}) == 3.0
+    assert retry_after_seconds(None, default=60.0) == 60.0
+    assert retry_after_seconds({"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"}, default=60.0) == 60.0
@@ -1,2 +1,3 @@
 # Utils package
 from .prompts import SYSTEM_PROMPT, VERIFICATION_PROMPT, CLAIM_EXTRACTION_PROMPT
+from .budget import budget_manager, BudgetManager, GOOGLE_CSE, OPENROUTER
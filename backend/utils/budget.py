@@ -0,0 +1,390 @@
+"""
+Upstream budget manager
+Tracks per-second and per-day token buckets for quota-limited upstreams
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Any, Mapping, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from config import (
+    GOOGLE_CSE_DAILY_QUOTA,
+    GOOGLE_CSE_PER_SECOND,
+    OPENROUTER_DAILY_QUOTA,
+    OPENROUTER_PER_SECOND,
+    GOOGLE_CSE_RESET_TIMEZONE,
+    OPENROUTER_RESET_TIMEZONE,
+    BUDGET_STATE_FILE
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+GOOGLE_CSE = "google_cse"
+OPENROUTER = "openrouter"
+
+# Markers upstreams use when a 429 means the daily quota is spent, rather than
+# a short-term rate limit (Google CSE: dailyLimitExceeded / "Queries per day",
+# OpenRouter: "free-models-per-day")
+DAILY_QUOTA_MARKERS = ("dailylimitexceeded", "per day", "per-day")
+
+# Cooldown applied after a short-term rate limit without a Retry-After header
+DEFAULT_RATE_LIMIT_COOLDOWN = 60.0
+
+
+def is_daily_quota_error(message: str) -> bool:
+    """Check whether a 429 error body reports the daily quota as spent"""
+    message = message.lower()
+    return any(marker in message for marker in DAILY_QUOTA_MARKERS)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]], default: float = DEFAULT_RATE_LIMIT_COOLDOWN) -> float:
+    """Read the Retry-After header of a 429 response in seconds"""
+    try:
+        return max(0.0, float((headers or {}).get("Retry-After", default)))
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """Per-second token bucket that refills continuously"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.cooldown_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self, cost: float = 1.0) -> bool:
+        """Take tokens if available"""
+        self._refill()
+        if self.updated_at >= self.cooldown_until and self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def wait_time(self, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available"""
+        self._refill()
+        cooldown = max(0.0, self.cooldown_until - self.updated_at)
+        if self.tokens >= cost or self.rate <= 0:
+            return cooldown
+        return max(cooldown, (cost - self.tokens) / self.rate)
+
+    def cool_down(self, seconds: float):
+        """Stop handing out tokens for a while, e.g. after the upstream reports 429"""
+        self._refill()
+        self.tokens = 0.0
+        self.cooldown_until = max(self.cooldown_until, self.updated_at + seconds)
+
+
+class DailyBucket:
+    """
+    Per-day token bucket that refills in full at the quota reset boundary
+
+    Upstream daily quotas are fixed windows, so a continuously refilling
+    bucket could spend more than the quota within a single day.
+    """
+
+    def __init__(self, capacity: int, day: str, used: int = 0):
+        self.capacity = capacity
+        self.day = day
+        self.used = used
+        # Spent since the last merge with the state file
+        self.pending = 0
+
+    def roll(self, today: str):
+        """Reset the counter when the quota window has moved on"""
+        if self.day != today:
+            self.day = today
+            self.used = 0
+            self.pending = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.capacity - self.used)
+
+    def try_take(self, cost: int = 1) -> bool:
+        """Take tokens if the daily quota allows it"""
+        if self.remaining >= cost:
+            self.used += cost
+            self.pending += cost
+            return True
+        return False
+
+    def exhaust(self):
+        """Mark the quota as spent, e.g. after the upstream reports its daily limit"""
+        if self.used < self.capacity:
+            self.pending += self.capacity - self.used
+            self.used = self.capacity
+
+    def merge(self, stored_used: int) -> int:
+        """
+        Fold pending spend into the count stored by all processes
+
+        Args:
+            stored_used: Count stored in the state file for the current day
+
+        Returns:
+            The new count to store
+        """
+        total = stored_used + self.pending
+        self.used = max(self.used, total)
+        self.pending = 0
+        return total
+
+
+class BudgetManager:
+    """
+    Budget manager for quota-limited upstreams with persisted daily counters
+
+    Spend is counted in memory and merged into the state file by `flush`,
+    which adds each process's pending spend to the stored count under a
+    file lock. Several workers can share one state file, but each only sees
+    the others' spend after a flush, so they can overspend the daily quota
+    by at most what is spent within one flush interval. Per-second buckets
+    are per process.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, Any]], state_file: str):
+        """
+        Args:
+            limits: Mapping of upstream name to {"daily": quota, "per_second": rate,
+                "timezone": zone in which the daily quota resets (UTC if omitted)}
+            state_file: JSON file used to persist and share daily counters
+        """
+        self.state_file = state_file
+        self._lock = threading.Lock()
+
+        saved = self._load()
+
+        self.timezones: Dict[str, Any] = {}
+        self.per_second: Dict[str, TokenBucket] = {}
+        self.daily: Dict[str, DailyBucket] = {}
+        for name, limit in limits.items():
+            self.timezones[name] = self._zone(limit.get("timezone", "UTC"))
+            today = self._today(name)
+            entry = saved.get(name, {})
+            self.per_second[name] = TokenBucket(float(limit["per_second"]))
+            self.daily[name] = DailyBucket(
+                int(limit["daily"]),
+                entry.get("day", today),
+                entry.get("used", 0)
+            )
+            self.daily[name].roll(today)
+
+    @staticmethod
+    def _zone(name: str):
+        """Resolve a quota reset timezone"""
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            # Also reached when no tz database is installed, so avoid ZoneInfo here
+            print(f"Unknown quota timezone '{name}', falling back to UTC")
+            return dt_timezone.utc
+
+    def _today(self, upstream: str) -> str:
+        """Current quota day of an upstream"""
+        return datetime.now(self.timezones[upstream]).date().isoformat()
+
+    def _load(self) -> Dict[str, Any]:
+        """Load persisted daily counters, dropping malformed entries"""
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Budget state load error: {e}")
+            return {}
+        if not isinstance(data, dict):
+            print("Budget state load error: expected a JSON object")
+            return {}
+
+        entries = {}
+        for name, entry in data.items():
+            if (
+                isinstance(entry, dict)
+                and isinstance(entry.get("day"), str)
+                and isinstance(entry.get("used"), int)
+                and not isinstance(entry.get("used"), bool)
+            ):
+                entries[name] = entry
+            else:
+                print(f"Budget state load error: ignoring malformed entry for '{name}'")
+        return entries
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by all processes using the state file"""
+        with open(f"{self.state_file}.lock", "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _sync(self):
+        """Merge pending spend with the state file and pick up other processes' spend"""
+        try:
+            with self._file_lock():
+                saved = self._load()
+                with self._lock:
+                    dirty = False
+                    data = dict(saved)
+                    pending = {}
+                    for name, bucket in self.daily.items():
+                        bucket.roll(self._today(name))
+                        entry = saved.get(name, {})
+                        stored_used = entry["used"] if entry.get("day") == bucket.day else 0
+                        dirty = dirty or bucket.pending > 0 or entry.get("day") != bucket.day
+                        pending[name] = bucket.pending
+                        data[name] = {"day": bucket.day, "used": bucket.merge(stored_used)}
+                if not dirty:
+                    return
+                tmp_path = f"{self.state_file}.tmp"
+                try:
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(data, f)
+                    os.replace(tmp_path, self.state_file)
+                except OSError:
+                    # Keep the spend pending so the next flush retries it
+                    with self._lock:
+                        for name, bucket in self.daily.items():
+                            if bucket.day == data[name]["day"]:
+                                bucket.pending += pending[name]
+                    raise
+        except OSError as e:
+            print(f"Budget state save error: {e}")
+
+    async def flush(self):
+        """Persist pending spend without blocking the event loop"""
+        await asyncio.to_thread(self._sync)
+
+    async def run_flush_loop(self, interval: float):
+        """Flush periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Keep flushing, the spend stays pending for the next attempt
+                print(f"Budget flush error: {e}")
+
+    def remaining(self, upstream: str) -> int:
+        """Remaining daily quota for an upstream"""
+        with self._lock:
+            bucket = self.daily[upstream]
+            bucket.roll(self._today(upstream))
+            return bucket.remaining
+
+    def remaining_fraction(self, upstream: str) -> float:
+        """Remaining daily quota as a fraction of the full quota"""
+        capacity = self.daily[upstream].capacity
+        if capacity <= 0:
+            return 0.0
+        return self.remaining(upstream) / capacity
+
+    def try_acquire(self, upstream: str, cost: int = 1) -> bool:
+        """Spend budget for one upstream call without waiting"""
+        with self._lock:
+            daily = self.daily[upstream]
+            daily.roll(self._today(upstream))
+            if daily.remaining < cost or not self.per_second[upstream].try_take(cost):
+                return False
+            daily.try_take(cost)
+            return True
+
+    async def acquire(self, upstream: str, cost: int = 1, max_wait: float = 5.0) -> bool:
+        """
+        Spend budget for one upstream call, waiting briefly for the per-second bucket
+
+        Args:
+            upstream: Upstream name
+            cost: Number of calls to spend
+            max_wait: Maximum seconds to wait for per-second tokens
+
+        Returns:
+            True if the call may proceed, False if the budget is exhausted
+            or the upstream is cooling down for longer than max_wait
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            if self.try_acquire(upstream, cost):
+                return True
+            if self.remaining(upstream) < cost:
+                return False
+            with self._lock:
+                wait = self.per_second[upstream].wait_time(cost)
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(max(wait, 0.01))
+
+    def cool_down(self, upstream: str, seconds: float = DEFAULT_RATE_LIMIT_COOLDOWN):
+        """Back off an upstream that reported a short-term rate limit"""
+        with self._lock:
+            self.per_second[upstream].cool_down(seconds)
+
+    def mark_exhausted(self, upstream: str):
+        """Record that the upstream itself reported its daily quota as spent"""
+        with self._lock:
+            daily = self.daily[upstream]
+            daily.roll(self._today(upstream))
+            daily.exhaust()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current budget state for every upstream"""
+        with self._lock:
+            status = {}
+            for name, daily in self.daily.items():
+                daily.roll(self._today(name))
+                per_second = self.per_second[name]
+                per_second._refill()
+                status[name] = {
+                    "day": daily.day,
+                    "daily_quota": daily.capacity,
+                    "daily_used": daily.used,
+                    "daily_remaining": daily.remaining,
+                    "per_second_rate": per_second.rate,
+                    "per_second_available": round(per_second.tokens, 2)
+                }
+            return status
+
+
+# Create singleton instance
+budget_manager = BudgetManager(
+    {
+        GOOGLE_CSE: {
+            "daily": GOOGLE_CSE_DAILY_QUOTA,
+            "per_second": GOOGLE_CSE_PER_SECOND,
+            "timezone": GOOGLE_CSE_RESET_TIMEZONE
+        },
+        OPENROUTER: {
+            "daily": OPENROUTER_DAILY_QUOTA,
+            "per_second": OPENROUTER_PER_SECOND,
+            "timezone": OPENROUTER_RESET_TIMEZONE
+        }
+    },
+    BUDGET_STATE_FILE
+)